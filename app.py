@@ -1,30 +1,63 @@
 # app.py (reports service - matching tasks service structure)
 import os
+import re
 import time
+import hashlib
 import logging
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from functools import wraps
-from datetime import datetime
+from itertools import islice
+from datetime import datetime, timezone
 import json
 
+import click
+import orjson
+import cachetools
 from dotenv import load_dotenv
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+from flask.json.provider import JSONProvider
 from flask_pymongo import PyMongo
 from bson.objectid import ObjectId
 from bson.errors import InvalidId
-from pymongo import ReturnDocument
-from jose import jwt
+from pymongo import InsertOne, MongoClient, ReplaceOne, ReturnDocument, UpdateOne, WriteConcern
+from pymongo.errors import BulkWriteError, WriteError
+import jwt
+from jwt.algorithms import RSAAlgorithm
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
-from flask_cors import CORS
+from flask_caching import Cache
+from werkzeug.exceptions import BadRequest
 
 # Load env
 load_dotenv()
 
 # Logger
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "DEBUG").upper())
 logger = logging.getLogger("reports-app")
 
+
+# JSON via orjson
+class OrjsonProvider(JSONProvider):
+    """JSON do Flask (jsonify, request.get_json) via orjson.
+
+    datetime é serializado nativamente; ObjectId (e outros tipos) caem no default=str.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=str).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # bytes direto para o Response, sem o passo intermediário por str
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=str), mimetype="application/json")
+
+
 app = Flask(__name__)
 
 # -------------------------
@@ -40,13 +73,48 @@ if FRONTEND_ORIGINS.strip() == "*":
 else:
     cors_origins = [o.strip() for o in FRONTEND_ORIGINS.split(",") if o.strip()]
 
-# Initialize CORS with full configuration
-CORS(app,
-     resources={r"/*": {"origins": cors_origins}},
-     supports_credentials=True,
-     allow_headers=["Content-Type", "Authorization", "Accept"],
-     expose_headers=["Content-Type"],
-     methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
+# CORS estático: a lista de origens é fixa no boot, então um set + headers constantes
+# substituem o flask-cors (que casava regex de resources a cada request).
+# Com "*" e credenciais a origem é ecoada, como o flask-cors fazia.
+_CORS_ALLOWED_ORIGINS = None if cors_origins == "*" else frozenset(cors_origins)
+_CORS_ALLOW_HEADERS = "Content-Type, Authorization, Accept"
+_CORS_ALLOW_METHODS = "GET, POST, PUT, DELETE, OPTIONS"
+_CORS_EXPOSE_HEADERS = "Content-Type"
+
+
+def _cors_origin_allowed(origin):
+    return bool(origin) and (_CORS_ALLOWED_ORIGINS is None or origin in _CORS_ALLOWED_ORIGINS)
+
+
+@app.before_request
+def cors_preflight():
+    # preflight de origem permitida responde na hora, sem passar por auth nem pela view.
+    # Rota inexistente (url_rule None) ou origem não permitida seguem o fluxo normal do
+    # Flask: 404/405 do roteamento ou a resposta OPTIONS automática, sem headers CORS.
+    if (request.method == "OPTIONS" and request.url_rule is not None
+            and _cors_origin_allowed(request.environ.get("HTTP_ORIGIN"))):
+        return app.response_class(status=204)
+
+
+@app.after_request
+def add_cors_headers(response):
+    origin = request.environ.get("HTTP_ORIGIN")
+    if not _cors_origin_allowed(origin):
+        return response
+    headers = response.headers
+    headers["Access-Control-Allow-Origin"] = origin
+    headers["Access-Control-Allow-Credentials"] = "true"
+    response.vary.add("Origin")
+    if request.method == "OPTIONS":
+        headers["Access-Control-Allow-Methods"] = _CORS_ALLOW_METHODS
+        headers["Access-Control-Allow-Headers"] = _CORS_ALLOW_HEADERS
+    else:
+        headers["Access-Control-Expose-Headers"] = _CORS_EXPOSE_HEADERS
+    return response
+
+# Cache em processo do corpo serializado de GET /reports
+# (até 64 entradas por worker, cada uma com no máximo REPORTS_CACHE_MAX_BYTES)
+cache = Cache(app, config={"CACHE_TYPE": "SimpleCache", "CACHE_DEFAULT_TIMEOUT": 30, "CACHE_THRESHOLD": 64})
 
 # -------------------------
 # Auth0 / JWKS config
@@ -56,26 +124,178 @@ AUTH0_AUDIENCE = os.getenv("API_AUDIENCE") or os.getenv("AUTH0_AUDIENCE") or os.
 ALGORITHMS = ["RS256"]
 
 # JWKS cache
-_JWKS_CACHE = {"fetched_at": 0, "jwks": None, "ttl": 3600}
+_JWKS_CACHE = {
+    "fetched_at": 0, "jwks": None, "by_kid": {}, "ttl": 3600, "forced_at": 0,
+    "etag": None, "last_modified": None
+}
 
+_JWKS_LOCK = threading.Lock()
+_JWKS_REFRESHER = {"thread": None}
+JWKS_MIN_TTL, JWKS_MAX_TTL = 300, 3600  # limites para o max-age anunciado pelo Auth0
+JWKS_STALE_FACTOR = 10  # JWKS vencido ainda é servido até 10x o TTL enquanto o refresh não chega
+JWKS_RETRY_INTERVAL = 30  # espera após um refresh com falha
+JWKS_FORCED_REFRESH_INTERVAL = 60  # kid desconhecido força no máximo um refetch por intervalo
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
 
-def _get_jwks():
-    if not AUTH0_DOMAIN:
-        raise RuntimeError("AUTH0_DOMAIN não configurado (ver .env)")
-    now = time.time()
-    if _JWKS_CACHE["jwks"] and now - _JWKS_CACHE["fetched_at"] < _JWKS_CACHE["ttl"]:
-        return _JWKS_CACHE["jwks"]
+
+def _jwks_ttl(response):
+    match = _MAX_AGE_RE.search(response.headers.get("Cache-Control", ""))
+    if not match:
+        return JWKS_MAX_TTL
+    return min(max(int(match.group(1)), JWKS_MIN_TTL), JWKS_MAX_TTL)
+
+
+def _fetch_jwks():
     jwks_url = f"https://{AUTH0_DOMAIN}/.well-known/jwks.json"
-    r = requests.get(jwks_url, timeout=5)
+    # revalidação condicional: se nada mudou, o Auth0 responde 304 sem corpo
+    headers = {}
+    if _JWKS_CACHE["jwks"] and _JWKS_CACHE["etag"]:
+        headers["If-None-Match"] = _JWKS_CACHE["etag"]
+    if _JWKS_CACHE["jwks"] and _JWKS_CACHE["last_modified"]:
+        headers["If-Modified-Since"] = _JWKS_CACHE["last_modified"]
+    # sessão compartilhada: reaproveita a conexão keep-alive com o Auth0
+    r = _http_session.get(jwks_url, headers=headers, timeout=5)
+    if r.status_code == 304 and _JWKS_CACHE["jwks"]:
+        _JWKS_CACHE.update({"fetched_at": time.time(), "ttl": _jwks_ttl(r)})
+        return _JWKS_CACHE["jwks"]
     r.raise_for_status()
     jwks = r.json()
-    _JWKS_CACHE.update({"jwks": jwks, "fetched_at": now})
+    # pré-constrói a RSAPublicKey (cryptography) por kid: a validação do token vira um
+    # lookup no dict e o jwt.decode não refaz o parse de n/e a cada requisição
+    by_kid = {}
+    for key in jwks.get("keys", []):
+        rsa_key = {
+            "kty": key.get("kty"),
+            "kid": key.get("kid"),
+            "use": key.get("use"),
+            "n": key.get("n"),
+            "e": key.get("e")
+        }
+        try:
+            by_kid[key.get("kid")] = RSAAlgorithm.from_jwk(json.dumps(rsa_key))
+        except Exception as e:
+            logger.warning("Ignorando JWK %s: %s", key.get("kid"), e)
+    _JWKS_CACHE.update({
+        "jwks": jwks,
+        "by_kid": by_kid,
+        "fetched_at": time.time(),
+        "ttl": _jwks_ttl(r),
+        "etag": r.headers.get("ETag"),
+        "last_modified": r.headers.get("Last-Modified")
+    })
     return jwks
 
 
+def _refresh_jwks_loop():
+    # renova na metade do TTL, para nenhuma requisição pagar o fetch
+    while True:
+        next_refresh = _JWKS_CACHE["fetched_at"] + _JWKS_CACHE["ttl"] / 2
+        time.sleep(max(next_refresh - time.time(), 1))
+        try:
+            with _JWKS_LOCK:
+                _fetch_jwks()
+        except Exception as e:
+            logger.warning("Falha ao renovar JWKS em background: %s", e)
+            time.sleep(JWKS_RETRY_INTERVAL)
+
+
+def _start_jwks_refresher():
+    # iniciado sob demanda (e não no import) para rodar em cada worker após o fork
+    if _JWKS_REFRESHER["thread"] is not None:
+        return
+    with _JWKS_LOCK:
+        if _JWKS_REFRESHER["thread"] is None:
+            t = threading.Thread(target=_refresh_jwks_loop, name="jwks-refresher", daemon=True)
+            t.start()
+            _JWKS_REFRESHER["thread"] = t
+
+
+def _jwks_usable():
+    # stale-while-revalidate: serve o JWKS em cache (mesmo vencido) até o limite de staleness
+    return (_JWKS_CACHE["jwks"] is not None
+            and time.time() - _JWKS_CACHE["fetched_at"] < _JWKS_CACHE["ttl"] * JWKS_STALE_FACTOR)
+
+
+def _get_jwks():
+    if not AUTH0_DOMAIN:
+        raise RuntimeError("AUTH0_DOMAIN não configurado (ver .env)")
+    if not _jwks_usable():
+        # só bloqueia a requisição sem JWKS algum (ou velho demais)
+        with _JWKS_LOCK:
+            # outra thread pode ter buscado enquanto esperávamos o lock
+            if not _jwks_usable():
+                _fetch_jwks()
+    _start_jwks_refresher()
+    return _JWKS_CACHE["jwks"]
+
+
+# Cache de tokens já validados (evita refazer a verificação RS256 a cada request)
+TOKEN_CACHE_MAX_TTL = 300  # segundos
+TOKEN_CACHE_EXP_MARGIN = 30  # folga para clock skew antes do exp do token
+
+
+def _token_ttu(_key, value, now):
+    # cada entrada vive até exp - margem (no máximo TOKEN_CACHE_MAX_TTL); sem exp, não é cacheada
+    return min(now + TOKEN_CACHE_MAX_TTL, value[1] - TOKEN_CACHE_EXP_MARGIN)
+
+
+_TOKEN_CACHE = cachetools.TLRUCache(maxsize=4096, ttu=_token_ttu, timer=time.time)
+_TOKEN_CACHE_LOCK = threading.Lock()
+
+
+def _token_cache_key(token):
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+
+def _get_rsa_key(kid):
+    _get_jwks()
+    key = _JWKS_CACHE["by_kid"].get(kid)
+    if key is None and time.time() - _JWKS_CACHE["forced_at"] >= JWKS_FORCED_REFRESH_INTERVAL:
+        # kid desconhecido: o Auth0 pode ter rotacionado a chave; refaz o fetch uma vez
+        with _JWKS_LOCK:
+            if kid not in _JWKS_CACHE["by_kid"] and time.time() - _JWKS_CACHE["forced_at"] >= JWKS_FORCED_REFRESH_INTERVAL:
+                _JWKS_CACHE["forced_at"] = time.time()
+                _fetch_jwks()
+        key = _JWKS_CACHE["by_kid"].get(kid)
+    return key
+
+
 # -------------------------
 # Helpers / Auth decorator
 # -------------------------
+def _verify_token(token):
+    """Valida assinatura/claims do JWT. Retorna (payload, None) ou (None, resposta de erro)."""
+    try:
+        unverified_header = jwt.get_unverified_header(token)
+    except Exception:
+        return None, (jsonify({"error": "Invalid token header"}), 401)
+
+    try:
+        rsa_key = _get_rsa_key(unverified_header.get("kid"))
+    except Exception as e:
+        logger.exception("Failed to fetch JWKS")
+        return None, (jsonify({"error": f"Erro ao buscar JWKS: {str(e)}"}), 500)
+
+    if not rsa_key:
+        return None, (jsonify({"error": "Appropriate JWK not found"}), 401)
+
+    try:
+        payload = jwt.decode(
+            token,
+            key=rsa_key,
+            algorithms=ALGORITHMS,
+            audience=AUTH0_AUDIENCE,
+            issuer=f"https://{AUTH0_DOMAIN}/",
+            options={"require": ["exp", "iat"]}
+        )
+    except jwt.ExpiredSignatureError:
+        return None, (jsonify({"error": "Token expired"}), 401)
+    except Exception as e:
+        logger.warning("Token validation error: %s", e)
+        return None, (jsonify({"error": f"Token inválido: {str(e)}"}), 401)
+    return payload, None
+
+
 def requires_auth_api(required_scope: str = None):
     def decorator(f):
         @wraps(f)
@@ -84,60 +304,35 @@ def requires_auth_api(required_scope: str = None):
                 request.current_user = {"sub": "test-user"}
                 return f(*args, **kwargs)
 
-            auth = request.headers.get("Authorization", None)
+            # lido direto do environ, sem passar pelo EnvironHeaders do Werkzeug
+            auth = request.environ.get("HTTP_AUTHORIZATION")
             if not auth:
                 return jsonify({"error": "Authorization header missing"}), 401
 
-            parts = auth.split()
-            if parts[0].lower() != "bearer" or len(parts) != 2:
+            # caminho rápido sem split/lower; o esquema continua case-insensitive
+            if not (auth.startswith("Bearer ") or auth[:7].lower() == "bearer "):
+                return jsonify({"error": "Invalid Authorization header"}), 401
+            token = auth[7:].strip()
+            if not token or " " in token:
                 return jsonify({"error": "Invalid Authorization header"}), 401
-            token = parts[1]
-
-            try:
-                unverified_header = jwt.get_unverified_header(token)
-            except Exception:
-                return jsonify({"error": "Invalid token header"}), 401
-
-            try:
-                jwks = _get_jwks()
-            except Exception as e:
-                logger.exception("Failed to fetch JWKS")
-                return jsonify({"error": f"Erro ao buscar JWKS: {str(e)}"}), 500
-
-            rsa_key = {}
-            for key in jwks.get("keys", []):
-                if key.get("kid") == unverified_header.get("kid"):
-                    rsa_key = {
-                        "kty": key.get("kty"),
-                        "kid": key.get("kid"),
-                        "use": key.get("use"),
-                        "n": key.get("n"),
-                        "e": key.get("e")
-                    }
-                    break
-
-            if not rsa_key:
-                return jsonify({"error": "Appropriate JWK not found"}), 401
-
-            try:
-                payload = jwt.decode(
-                    token,
-                    rsa_key,
-                    algorithms=ALGORITHMS,
-                    audience=AUTH0_AUDIENCE,
-                    issuer=f"https://{AUTH0_DOMAIN}/"
-                )
-            except jwt.ExpiredSignatureError:
-                return jsonify({"error": "Token expired"}), 401
-            except Exception as e:
-                logger.warning("Token validation error: %s", e)
-                return jsonify({"error": f"Token inválido: {str(e)}"}), 401
 
-            if required_scope:
+            cache_key = _token_cache_key(token)
+            with _TOKEN_CACHE_LOCK:
+                cached = _TOKEN_CACHE.get(cache_key)
+            if cached is not None:
+                payload, _exp, scope_set = cached
+            else:
+                payload, error = _verify_token(token)
+                if error:
+                    return error
+                # scopes parseados uma vez por token e guardados junto na entrada do cache
                 scopes = payload.get("scope", "")
-                scopes_list = scopes.split() if isinstance(scopes, str) else []
-                if required_scope not in scopes_list:
-                    return jsonify({"error": "Insufficient scope"}), 403
+                scope_set = frozenset(scopes.split()) if isinstance(scopes, str) else frozenset()
+                with _TOKEN_CACHE_LOCK:
+                    _TOKEN_CACHE[cache_key] = (payload, payload.get("exp", 0), scope_set)
+
+            if required_scope and required_scope not in scope_set:
+                return jsonify({"error": "Insufficient scope"}), 403
 
             request.current_user = payload
             return f(*args, **kwargs)
@@ -148,15 +343,33 @@ def requires_auth_api(required_scope: str = None):
 # -------------------------
 # DB
 # -------------------------
-mongo = PyMongo(app)
+# pool dimensionado para as conexões concorrentes de um worker gevent; minPoolSize pré-aquece
+# sockets. Compressão de rede (zstd, com zlib como fallback) para os conteúdos grandes.
+# Timeouts pensados para requisições HTTP; comandos longos (índices) usam outro cliente.
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 2000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 5000))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 1000))
+mongo = PyMongo(
+    app,
+    maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", 200)),
+    minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", 20)),
+    compressors=os.getenv("MONGO_COMPRESSORS", "zstd,zlib"),
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    retryWrites=True
+)
+# depois do PyMongo: o init_app dele troca app.json pelo BSONProvider
+app.json = OrjsonProvider(app)
 
 # -------------------------
-# HTTP session com retries (para fallback sync validation)
+# HTTP session com retries (fallback sync validation e JWKS)
 # -------------------------
 def make_http_session():
     session = requests.Session()
     retries = Retry(total=1, backoff_factor=0.2, status_forcelist=[500,502,503,504])
-    adapter = HTTPAdapter(max_retries=retries)
+    # pool compartilhado entre as threads/greenlets do worker (tasks-service e Auth0)
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=retries)
     session.mount("http://", adapter)
     session.mount("https://", adapter)
     return session
@@ -167,33 +380,87 @@ _http_session = make_http_session()
 # -------------------------
 # Logging
 # -------------------------
+# preflights e probes não precisam do log detalhado
+_UNLOGGED_PATHS = frozenset(("/health", "/ready"))
+
+
 @app.before_request
 def log_request_info():
+    if request.method == "OPTIONS" or request.path in _UNLOGGED_PATHS:
+        return
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
     logger.debug("Incoming request: %s %s", request.method, request.path)
     # show only key headers and NEVER Authorization
     hdrs = {k: v for k, v in request.headers.items() if k in ("Host", "Origin", "Content-Type")}
     logger.debug("Headers: %s", hdrs)
-    try:
-        logger.debug("Body preview: %s", request.get_data(as_text=True)[:1000])
-    except Exception:
-        pass
+    # evita bufferizar/decodificar corpos grandes só para o preview
+    if request.content_length and request.content_length < 4096:
+        try:
+            logger.debug("Body preview: %s", request.get_data(as_text=True)[:1000])
+        except Exception:
+            pass
+
+
+# -------------------------
+# Helpers: ObjectId
+# -------------------------
+_OBJECT_ID_RE = re.compile(r"[0-9a-fA-F]{24}")
+
+
+def parse_object_id(value):
+    # checagem barata antes de construir: ids inválidos não passam pelo caminho de exceção
+    # (ObjectId.is_valid faz try/except internamente e construiria o id duas vezes)
+    if isinstance(value, ObjectId):
+        return value
+    if not isinstance(value, str) or not _OBJECT_ID_RE.fullmatch(value):
+        return None
+    return ObjectId(value)
 
 
 # -------------------------
 # Helpers: validation híbrida de task_id
 # -------------------------
+# single-flight por task_id (locks "listrados": memória fixa) + cache negativo de 404
+_TASK_FETCH_LOCKS = [threading.Lock() for _ in range(64)]
+_TASK_NEG_CACHE = cachetools.TTLCache(maxsize=1024, ttl=30)
+_TASK_NEG_CACHE_LOCK = threading.Lock()
+
+
+def _task_known_missing(obj_id):
+    with _TASK_NEG_CACHE_LOCK:
+        return obj_id in _TASK_NEG_CACHE
+
+
 def validate_task_id_hybrid(task_id):
     # 1) tentar no snapshot local
-    try:
-        obj_id = ObjectId(task_id)
-    except Exception:
+    obj_id = parse_object_id(task_id)
+    if obj_id is None:
         return False, "invalid_id", None
 
     snap = mongo.db.task_snapshots.find_one({"_id": obj_id})
     if snap:
         return True, "ok", snap
+    if _task_known_missing(obj_id):
+        return False, "not_found", None
+
+    # 2) fallback sync para tasks-service: uma única chamada por task_id em voo
+    with _TASK_FETCH_LOCKS[hash(obj_id) % len(_TASK_FETCH_LOCKS)]:
+        # outra requisição pode ter buscado (e salvo o snapshot) enquanto esperávamos
+        snap = mongo.db.task_snapshots.find_one({"_id": obj_id})
+        if snap:
+            return True, "ok", snap
+        if _task_known_missing(obj_id):
+            return False, "not_found", None
 
-    # 2) fallback sync para tasks-service
+        result = _fetch_task_from_service(task_id, obj_id)
+        if result[1] == "not_found":
+            with _TASK_NEG_CACHE_LOCK:
+                _TASK_NEG_CACHE[obj_id] = True
+        return result
+
+
+def _fetch_task_from_service(task_id, obj_id):
     try:
         # Passar o token de autenticação do request atual
         headers = {}
@@ -207,7 +474,6 @@ def validate_task_id_hybrid(task_id):
             # salvar snapshot local (usando _id como ObjectId)
             try:
                 task_doc = {
-                    "_id": ObjectId(task_id),
                     "titulo": task.get("titulo"),
                     "descricao": task.get("descricao"),
                     "owner": task.get("owner") if isinstance(task, dict) else None,
@@ -215,7 +481,8 @@ def validate_task_id_hybrid(task_id):
                     "criado_em": task.get("criado_em", time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())),
                     "atualizado_em": task.get("atualizado_em", time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()))
                 }
-                mongo.db.task_snapshots.replace_one({"_id": ObjectId(task_id)}, task_doc, upsert=True)
+                # $setOnInsert: só grava se o snapshot ainda não existe (não reescreve um já salvo)
+                mongo.db.task_snapshots.update_one({"_id": obj_id}, {"$setOnInsert": task_doc}, upsert=True)
             except Exception as e:
                 logger.warning("Falha ao persistir snapshot vindo do tasks-service: %s", e)
             return True, "ok", task
@@ -236,14 +503,275 @@ def get_idempotency_record(collection_name, idempotency_key):
         return None
     return mongo.db.idempotency.find_one({"collection": collection_name, "idempotency_key": idempotency_key})
 
+# registros de idempotency são auxiliares (o relatório é a fonte da verdade):
+# ack só do primário, sem esperar journal/maioria, para tirar esse round-trip do POST
+IDEMPOTENCY_WRITE_CONCERN = WriteConcern(w=1, j=False)
+
+def idempotency_collection():
+    return mongo.db.get_collection("idempotency", write_concern=IDEMPOTENCY_WRITE_CONCERN)
+
+def idempotency_record(collection_name, idempotency_key, resource):
+    # (filtro, documento) do registro de idempotency
+    filtro = {"collection": collection_name, "idempotency_key": idempotency_key}
+    return filtro, {**filtro, "resource": resource}
+
 def save_idempotency_record(collection_name, idempotency_key, resource):
     if not idempotency_key:
         return
-    mongo.db.idempotency.replace_one(
-        {"collection": collection_name, "idempotency_key": idempotency_key},
-        {"collection": collection_name, "idempotency_key": idempotency_key, "resource": resource},
-        upsert=True
-    )
+    filtro, doc = idempotency_record(collection_name, idempotency_key, resource)
+    idempotency_collection().replace_one(filtro, doc, upsert=True)
+
+
+# -------------------------
+# Helpers: timestamp da requisição
+# -------------------------
+_UTC = timezone.utc
+
+
+def utcnow():
+    # substitui datetime.utcnow() (deprecado); mantém o datetime ingênuo em UTC, como o Mongo devolve
+    return datetime.now(_UTC).replace(tzinfo=None)
+
+
+def request_now():
+    # um único datetime por requisição, reaproveitado em criado_em/atualizado_em
+    if "now" not in g:
+        g.now = utcnow()
+    return g.now
+
+
+# -------------------------
+# Helpers: micro-batching de escritas
+# -------------------------
+class MicroBatcher:
+    """Agrupa escritas de várias requisições concorrentes num único flush em background.
+
+    ``flush(items)`` recebe a lista de itens do lote e devolve um resultado por item,
+    na mesma ordem; um resultado que seja uma exceção é levantado só no ``submit``
+    daquele item. Cada requisição bloqueia em ``submit`` até o seu lote ser gravado.
+    Se o timeout vence com o item ainda na fila, ele é cancelado (nunca será gravado)
+    e ``submit`` levanta ``TimeoutError``; se o flush já começou, espera o resultado.
+    """
+
+    def __init__(self, name, flush, max_items=500, max_wait=0.02):
+        self.name = name
+        self.max_items = max_items
+        self.max_wait = max_wait
+        self._flush = flush
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, item, timeout=5):
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future))
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            # só desiste se o item ainda não entrou num flush; senão a escrita está em curso
+            if future.cancel():
+                raise
+            return future.result()
+
+    def _ensure_started(self):
+        # sob demanda, para rodar em cada worker após o fork do gunicorn
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_items:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            # descarta itens cujo submit já desistiu (cancelados por timeout)
+            batch = [(item, f) for item, f in batch if f.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            futures = [f for _, f in batch]
+            try:
+                results = self._flush([item for item, _ in batch])
+            except Exception as e:
+                logger.exception("Falha no flush do lote %s", self.name)
+                for f in futures:
+                    f.set_exception(e)
+                continue
+            for f, result in zip(futures, results):
+                if isinstance(result, Exception):
+                    f.set_exception(result)
+                else:
+                    f.set_result(result)
+
+
+# -------------------------
+# Helpers: versão da coleção (ETag)
+# -------------------------
+# contador em Mongo (e não em memória) para ficar consistente entre workers do gunicorn
+def get_reports_version():
+    doc = mongo.db.counters.find_one({"_id": "reports"})
+    return doc["version"] if doc else 0
+
+def bump_reports_version():
+    mongo.db.counters.update_one({"_id": "reports"}, {"$inc": {"version": 1}}, upsert=True)
+
+
+# -------------------------
+# Helpers: serialização
+# -------------------------
+def _ms(dt):
+    # datetimes do Mongo são UTC ingênuos: fixa o tzinfo antes de timestamp()
+    if not isinstance(dt, datetime):
+        return dt
+    return int(dt.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def wants_epoch_ms():
+    # ?date_format=epoch_ms devolve datas como epoch em milissegundos (padrão: ISO 8601)
+    return request.args.get("date_format") == "epoch_ms"
+
+
+def report_to_json(report, epoch_ms=False):
+    # formato único de um relatório na API (datetimes ficam para o orjson)
+    task_id = report.get("task_id")
+    criado_em = report.get("criado_em")
+    atualizado_em = report.get("atualizado_em")
+    if epoch_ms:
+        criado_em, atualizado_em = _ms(criado_em), _ms(atualizado_em)
+    return {
+        "id": str(report["_id"]),
+        "titulo": report.get("titulo"),
+        "conteudo": report.get("conteudo"),
+        "task_id": str(task_id) if task_id else None,
+        "criado_em": criado_em,
+        "atualizado_em": atualizado_em
+    }
+
+
+def _reports_json(resource, status=200):
+    # resource: um relatório já serializado (ou lista deles); aplica ?date_format
+    if wants_epoch_ms():
+        items = resource if isinstance(resource, list) else [resource]
+        items = [{**r, "criado_em": _ms(r.get("criado_em")), "atualizado_em": _ms(r.get("atualizado_em"))} for r in items]
+        resource = items if isinstance(resource, list) else items[0]
+    return jsonify(resource), status
+
+
+def _body():
+    # parse direto com orjson; cache=False não mantém os bytes crus no request
+    raw = request.get_data(cache=False)
+    if not raw:
+        return None
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        raise BadRequest("JSON inválido")
+
+
+# corpos fixos pré-serializados no import. O Response é criado a cada chamada (não
+# compartilhado): hooks after_request, como add_cors_headers, alteram os headers da resposta.
+_HEALTH_BODY = orjson.dumps({"status": "ok", "service": "reports"})
+_READY_BODY = orjson.dumps({"ready": True})
+_NOT_READY_BODY = orjson.dumps({"ready": False})
+_INVALID_ID_BODY = orjson.dumps({"error": "ID inválido"})
+_NOT_FOUND_BODY = orjson.dumps({"error": "Relatório não encontrado"})
+_DELETED_BODY = orjson.dumps({"message": "Relatório deletado com sucesso"})
+
+
+def _static_json(body, status=200):
+    return app.response_class(body, status=status, mimetype="application/json")
+
+
+# campos devolvidos pela API (evita decodificar o documento inteiro)
+REPORT_PROJECTION = {"titulo": 1, "conteudo": 1, "task_id": 1, "criado_em": 1, "atualizado_em": 1}
+# máximo de relatórios aceitos por chamada em POST /reports/bulk
+REPORTS_BULK_MAX = int(os.getenv("REPORTS_BULK_MAX", 1000))
+# tamanho do lote do cursor e de cada pedaço serializado em GET /reports
+REPORTS_BATCH_SIZE = 1000
+# limite máximo de ?limit= em GET /reports
+REPORTS_MAX_LIMIT = 1000
+# corpos de GET /reports maiores que isso são só transmitidos, sem ir para o cache
+REPORTS_CACHE_MAX_BYTES = int(os.getenv("REPORTS_CACHE_MAX_BYTES", 1024 * 1024))
+
+
+# PUT /reports/<id> em rajadas (ex.: autosave) pode ser agrupado num bulk_write.
+# 0 (padrão) desliga: cada PUT faz seu próprio find_one_and_update.
+REPORTS_UPDATE_BATCH_MS = int(os.getenv("REPORTS_UPDATE_BATCH_MS", 0))
+
+
+def _bulk_write_errors(exc):
+    # BulkWriteError com ordered=False: as demais operações do lote foram aplicadas.
+    # Devolve {índice da operação: WriteError} só para as rejeitadas.
+    return {
+        err["index"]: WriteError(err.get("errmsg"), err.get("code"), err)
+        for err in exc.details.get("writeErrors", [])
+    }
+
+
+def _flush_report_updates(items):
+    # funde PUTs do mesmo relatório no lote (o último $set de cada campo vence)
+    merged = {}
+    for obj_id, fields in items:
+        merged.setdefault(obj_id, {}).update(fields)
+    ids = list(merged)
+    failed = {}
+    try:
+        mongo.db.reports.bulk_write(
+            [UpdateOne({"_id": obj_id}, {"$set": merged[obj_id]}) for obj_id in ids],
+            ordered=False
+        )
+    except BulkWriteError as e:
+        failed = {ids[i]: err for i, err in _bulk_write_errors(e).items()}
+    finally:
+        # uma única mudança de versão para o lote, mesmo com falhas parciais
+        bump_reports_version()
+    docs = {doc["_id"]: doc for doc in mongo.db.reports.find({"_id": {"$in": ids}}, REPORT_PROJECTION)}
+    return [failed.get(obj_id) or docs.get(obj_id) for obj_id, _ in items]
+
+
+_report_update_batcher = (
+    MicroBatcher("reports-update-batcher", _flush_report_updates, max_wait=REPORTS_UPDATE_BATCH_MS / 1000)
+    if REPORTS_UPDATE_BATCH_MS > 0 else None
+)
+
+# POST /reports sob carga pode agrupar inserts (e registros de idempotency) num bulk_write.
+# 0 (padrão) desliga: cada POST faz seu próprio insert_one.
+REPORTS_INSERT_BATCH_MS = int(os.getenv("REPORTS_INSERT_BATCH_MS", 0))
+
+
+def _flush_report_inserts(items):
+    # items: (report_doc com _id já definido, idempotency_key, resource)
+    results = [None] * len(items)
+    try:
+        mongo.db.reports.bulk_write([InsertOne(doc) for doc, _, _ in items], ordered=False)
+    except BulkWriteError as e:
+        # só os inserts rejeitados falham; os demais foram gravados e seguem normalmente
+        for i, err in _bulk_write_errors(e).items():
+            results[i] = err
+    finally:
+        # uma única mudança de versão para o lote inteiro, mesmo com falhas parciais
+        bump_reports_version()
+    idem_ops = [
+        ReplaceOne(*idempotency_record("reports", key, resource), upsert=True)
+        for (_, key, resource), result in zip(items, results) if key and result is None
+    ]
+    if idem_ops:
+        idempotency_collection().bulk_write(idem_ops, ordered=False)
+    return results
+
+
+_report_insert_batcher = (
+    MicroBatcher("reports-insert-batcher", _flush_report_inserts, max_wait=REPORTS_INSERT_BATCH_MS / 1000)
+    if REPORTS_INSERT_BATCH_MS > 0 else None
+)
 
 
 # -------------------------
@@ -251,38 +779,108 @@ def save_idempotency_record(collection_name, idempotency_key, resource):
 # -------------------------
 @app.route("/health", methods=["GET"])
 def health():
-    return jsonify({"status": "ok", "service": "reports"}), 200
+    return _static_json(_HEALTH_BODY, 200)
+
+# resultado do último ping, para probes frequentes não martelarem o Mongo
+_READY_CACHE = {"ts": 0, "ok": False}
+READY_CACHE_TTL = 2.0  # segundos
+
 
 @app.route("/ready", methods=["GET"])
 def ready():
-    try:
-        mongo.db.command("ping")
-        return jsonify({"ready": True}), 200
-    except Exception:
-        return jsonify({"ready": False}), 503
+    now = time.time()
+    if now - _READY_CACHE["ts"] >= READY_CACHE_TTL:
+        try:
+            # maxTimeMS: cluster travado responde 503 rápido em vez de prender o worker
+            mongo.cx.admin.command("ping", maxTimeMS=500)
+            ok = True
+        except Exception:
+            ok = False
+        _READY_CACHE.update({"ts": now, "ok": ok})
+    if _READY_CACHE["ok"]:
+        return _static_json(_READY_BODY, 200)
+    return _static_json(_NOT_READY_BODY, 503)
 
 
 @app.route("/reports", methods=["GET"])
 @requires_auth_api()
 def listar_reports():
-    reports = mongo.db.reports.find()
-    out = []
-    for report in reports:
-        out.append({
-            "id": str(report["_id"]),
-            "titulo": report.get("titulo"),
-            "conteudo": report.get("conteudo"),
-            "task_id": str(report.get("task_id")) if report.get("task_id") else None,
-            "criado_em": report.get("criado_em").isoformat() if report.get("criado_em") else None,
-            "atualizado_em": report.get("atualizado_em").isoformat() if report.get("atualizado_em") else None
-        })
-    return jsonify(out), 200
+    epoch_ms = wants_epoch_ms()
+
+    # paginação opcional por keyset: ?limit=N&after=<id do último relatório recebido>
+    limit = request.args.get("limit")
+    after = request.args.get("after")
+    if limit is not None:
+        if not limit.isdecimal() or not 0 < int(limit) <= REPORTS_MAX_LIMIT:
+            return jsonify({"error": f"'limit' deve ser um inteiro entre 1 e {REPORTS_MAX_LIMIT}"}), 400
+        limit = int(limit)
+    after_id = None
+    if after is not None:
+        after_id = parse_object_id(after)
+        if after_id is None:
+            return jsonify({"error": "'after' inválido"}), 400
+
+    # cada representação (ISO/epoch, página) tem sua própria ETag e entrada de cache
+    etag = f"{get_reports_version()}-{'ms' if epoch_ms else 'iso'}-{limit or 0}-{after_id or 0}"
+    if request.if_none_match.contains_weak(etag):
+        resp = Response(status=304)
+        resp.set_etag(etag, weak=True)
+        return resp
+
+    # chave inclui a versão da coleção: qualquer escrita (em qualquer worker) invalida
+    cache_key = f"reports_all:{etag}"
+    body = cache.get(cache_key)
+    if body is not None:
+        resp = Response(body, status=200, mimetype="application/json")
+        resp.set_etag(etag, weak=True)
+        return resp
+
+    # cursor em lotes + resposta em streaming: não materializa a coleção inteira em memória
+    if limit or after_id:
+        query = {"_id": {"$gt": after_id}} if after_id else {}
+        reports = mongo.db.reports.find(query, REPORT_PROJECTION).sort("_id", 1)
+        if limit:
+            reports = reports.limit(limit)
+        reports = reports.batch_size(min(limit or REPORTS_BATCH_SIZE, REPORTS_BATCH_SIZE))
+    else:
+        reports = mongo.db.reports.find({}, REPORT_PROJECTION).batch_size(REPORTS_BATCH_SIZE)
+
+    def gen():
+        # cada lote vira um único orjson.dumps (em C); só removemos os colchetes do pedaço.
+        # Os pedaços só são acumulados para o cache enquanto o corpo couber em
+        # REPORTS_CACHE_MAX_BYTES; acima disso a memória fica limitada ao lote.
+        chunks = [b"["]
+        size = 1
+        yield b"["
+        sep = b""
+        while True:
+            batch = [report_to_json(r, epoch_ms) for r in islice(reports, REPORTS_BATCH_SIZE)]
+            if not batch:
+                break
+            chunk = sep + orjson.dumps(batch, default=str)[1:-1]
+            sep = b","
+            if chunks is not None:
+                size += len(chunk)
+                if size > REPORTS_CACHE_MAX_BYTES:
+                    chunks = None
+                else:
+                    chunks.append(chunk)
+            yield chunk
+        yield b"]"
+        # só guarda no cache quando o cursor foi consumido até o fim
+        if chunks is not None:
+            chunks.append(b"]")
+            cache.set(cache_key, b"".join(chunks))
+
+    resp = Response(stream_with_context(gen()), status=200, mimetype="application/json")
+    resp.set_etag(etag, weak=True)
+    return resp
 
 
 @app.route("/reports", methods=["POST"])
 @requires_auth_api()
 def criar_report():
-    dados = request.json
+    dados = _body()
     if not dados or "titulo" not in dados or "conteudo" not in dados or "task_id" not in dados:
         return jsonify({"error": "Campos 'titulo', 'conteudo' e 'task_id' são obrigatórios"}), 400
 
@@ -292,34 +890,42 @@ def criar_report():
     idempotency_key = request.headers.get("Idempotency-Key")
     existing = get_idempotency_record("reports", idempotency_key)
     if existing:
-        return jsonify(existing["resource"]), 200
+        return _reports_json(existing["resource"], 200)
 
-    valid, reason, snapshot = validate_task_id_hybrid(task_id)
+    # parse único do task_id, reaproveitado na validação e no documento
+    obj_task_id = parse_object_id(task_id)
+    valid, reason, snapshot = validate_task_id_hybrid(obj_task_id)
     if valid is True:
-        agora = datetime.utcnow()
+        agora = request_now()
         report_doc = {
             "titulo": dados["titulo"],
             "conteudo": dados["conteudo"],
-            "task_id": ObjectId(task_id),
+            "task_id": obj_task_id,
             "criado_em": agora,
             "atualizado_em": agora,
             "status": "pending"
         }
-        report_id = mongo.db.reports.insert_one(report_doc).inserted_id
-
-        resource = {
-            "id": str(report_id),
-            "titulo": report_doc["titulo"],
-            "conteudo": report_doc["conteudo"],
-            "task_id": str(report_doc["task_id"]),
-            "criado_em": agora.isoformat(),
-            "atualizado_em": agora.isoformat()
-        }
+        if _report_insert_batcher is not None:
+            # _id gerado aqui: a resposta não depende do resultado do bulk_write
+            report_doc["_id"] = ObjectId()
+            resource = report_to_json(report_doc)
+            try:
+                _report_insert_batcher.submit((report_doc, idempotency_key, resource))
+            except FutureTimeoutError:
+                # item cancelado antes do flush: nada foi gravado, o retry é seguro
+                return jsonify({"error": "Não foi possível salvar o relatório no momento. Tente novamente mais tarde."}), 503
+            return _reports_json(resource, 201)
+
+        # insert_one preenche report_doc["_id"]
+        mongo.db.reports.insert_one(report_doc)
+        bump_reports_version()
+
+        resource = report_to_json(report_doc)
 
         # salvar idempotency
         save_idempotency_record("reports", idempotency_key, resource)
 
-        return jsonify(resource), 201
+        return _reports_json(resource, 201)
     elif valid is False:
         if reason == "invalid_id":
             return jsonify({"error": "task_id inválido"}), 400
@@ -329,52 +935,183 @@ def criar_report():
         return jsonify({"error": "Não foi possível validar a task no momento. Tente novamente mais tarde."}), 503
 
 
+@app.route("/reports/bulk", methods=["POST"])
+@requires_auth_api()
+def criar_reports_bulk():
+    dados = _body()
+    if not isinstance(dados, list) or not dados:
+        return jsonify({"error": "Corpo deve ser uma lista não vazia de relatórios"}), 400
+    if len(dados) > REPORTS_BULK_MAX:
+        return jsonify({"error": f"Máximo de {REPORTS_BULK_MAX} relatórios por requisição"}), 400
+
+    for i, item in enumerate(dados):
+        if not isinstance(item, dict) or "titulo" not in item or "conteudo" not in item or "task_id" not in item:
+            return jsonify({"error": "Campos 'titulo', 'conteudo' e 'task_id' são obrigatórios", "index": i}), 400
+        if not isinstance(item["task_id"], str):
+            return jsonify({"error": "task_id inválido", "index": i}), 400
+
+    # idempotency
+    idempotency_key = request.headers.get("Idempotency-Key")
+    existing = get_idempotency_record("reports_bulk", idempotency_key)
+    if existing:
+        return _reports_json(existing["resource"], 200)
+
+    # valida cada task_id distinto uma única vez
+    task_ids = {task_id: parse_object_id(task_id) for task_id in dict.fromkeys(item["task_id"] for item in dados)}
+    for task_id, obj_task_id in task_ids.items():
+        valid, reason, snapshot = validate_task_id_hybrid(obj_task_id)
+        if valid is False:
+            if reason == "invalid_id":
+                return jsonify({"error": "task_id inválido", "task_id": task_id}), 400
+            return jsonify({"error": "Task não encontrada", "task_id": task_id}), 400
+        if valid is None:
+            return jsonify({"error": "Não foi possível validar a task no momento. Tente novamente mais tarde."}), 503
+
+    agora = request_now()
+    report_docs = [{
+        "titulo": item["titulo"],
+        "conteudo": item["conteudo"],
+        "task_id": task_ids[item["task_id"]],
+        "criado_em": agora,
+        "atualizado_em": agora,
+        "status": "pending"
+    } for item in dados]
+    # um único round-trip para todos os documentos
+    # insert_many preenche o "_id" de cada documento
+    mongo.db.reports.insert_many(report_docs, ordered=False)
+    bump_reports_version()
+
+    resource = [report_to_json(doc) for doc in report_docs]
+
+    # salvar idempotency
+    save_idempotency_record("reports_bulk", idempotency_key, resource)
+
+    return _reports_json(resource, 201)
+
+
 @app.route("/reports/<id>", methods=["PUT"])
 @requires_auth_api()
 def atualizar_report(id):
-    dados = request.json or {}
-    try:
-        obj_id = ObjectId(id)
-    except Exception:
-        return jsonify({"error": "ID inválido"}), 400
+    obj_id = parse_object_id(id)
+    if obj_id is None:
+        return _static_json(_INVALID_ID_BODY, 400)
+    # ?fields=atualizado_em,titulo: devolve (e traz do Mongo) só esses campos
+    fields = request.args.get("fields")
+    projection = REPORT_PROJECTION
+    if fields is not None:
+        fields = [f.strip() for f in fields.split(",") if f.strip()]
+        if not fields or any(f not in REPORT_PROJECTION for f in fields):
+            return jsonify({"error": f"'fields' aceita: {', '.join(REPORT_PROJECTION)}"}), 400
+        projection = {f: 1 for f in fields}
+    dados = _body() or {}
 
-    agora = datetime.utcnow()
+    agora = request_now()
     update_fields = {"atualizado_em": agora}
     if "titulo" in dados:
         update_fields["titulo"] = dados["titulo"]
     if "conteudo" in dados:
         update_fields["conteudo"] = dados["conteudo"]
 
-    atualizado = mongo.db.reports.find_one_and_update(
-        {"_id": obj_id},
-        {"$set": update_fields},
-        return_document=ReturnDocument.AFTER
-    )
+    if _report_update_batcher is not None:
+        # o flush do lote já incrementa a versão da coleção
+        try:
+            atualizado = _report_update_batcher.submit((obj_id, update_fields))
+        except FutureTimeoutError:
+            # item cancelado antes do flush: nada foi gravado, o retry é seguro
+            return jsonify({"error": "Não foi possível salvar o relatório no momento. Tente novamente mais tarde."}), 503
+    else:
+        atualizado = mongo.db.reports.find_one_and_update(
+            {"_id": obj_id},
+            {"$set": update_fields},
+            projection=projection,
+            return_document=ReturnDocument.AFTER
+        )
+        if atualizado:
+            bump_reports_version()
     if not atualizado:
-        return jsonify({"error": "Relatório não encontrado"}), 404
+        return _static_json(_NOT_FOUND_BODY, 404)
 
-    return jsonify({
-        "id": str(atualizado["_id"]),
-        "titulo": atualizado.get("titulo"),
-        "conteudo": atualizado.get("conteudo"),
-        "task_id": str(atualizado.get("task_id")) if atualizado.get("task_id") else None,
-        "criado_em": atualizado.get("criado_em").isoformat() if atualizado.get("criado_em") else None,
-        "atualizado_em": atualizado.get("atualizado_em").isoformat() if atualizado.get("atualizado_em") else None
-    }), 200
+    resource = report_to_json(atualizado, wants_epoch_ms())
+    if fields:
+        resource = {k: v for k, v in resource.items() if k == "id" or k in projection}
+    return jsonify(resource), 200
 
 
 @app.route("/reports/<id>", methods=["DELETE"])
 @requires_auth_api()
 def deletar_report(id):
-    try:
-        obj_id = ObjectId(id)
-    except Exception:
-        return jsonify({"error": "ID inválido"}), 400
+    obj_id = parse_object_id(id)
+    if obj_id is None:
+        return _static_json(_INVALID_ID_BODY, 400)
 
     resultado = mongo.db.reports.delete_one({"_id": obj_id})
     if resultado.deleted_count == 0:
-        return jsonify({"error": "Relatório não encontrado"}), 404
-    return jsonify({"message": "Relatório deletado com sucesso"}), 200
+        return _static_json(_NOT_FOUND_BODY, 404)
+    bump_reports_version()
+    return _static_json(_DELETED_BODY, 200)
+
+
+# -------------------------
+# Índices
+# -------------------------
+def ensure_indexes():
+    # (task_id, criado_em desc) serve "relatórios de uma task, mais novos primeiro" e também
+    # consultas só por task_id (prefixo), então substitui o antigo índice simples em task_id.
+    # task_snapshots não precisa de índice explícito: o _id já é indexado pelo Mongo.
+    # create_index bloqueia até o build terminar: cliente próprio, sem o socketTimeoutMS
+    # das requisições (que derrubaria o build de uma coleção grande com NetworkTimeout).
+    with MongoClient(app.config["MONGO_URI"], socketTimeoutMS=None,
+                     serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS) as client:
+        db = client.get_default_database()
+        db.reports.create_index([("task_id", 1), ("criado_em", -1)], background=True)
+        db.idempotency.create_index(
+            [("collection", 1), ("idempotency_key", 1)], unique=True, sparse=True, background=True
+        )
+
+
+@app.cli.command("ensure-indexes")
+def ensure_indexes_command():
+    ensure_indexes()
+    click.echo("Índices garantidos.")
+
+
+# -------------------------
+# CLI: auditoria de índices
+# -------------------------
+AUDITED_COLLECTIONS = ("reports", "task_snapshots", "idempotency")
+# campos reescritos em todo PUT: um índice neles encarece cada escrita
+WRITE_HOT_FIELDS = ("atualizado_em",)
+
+
+def audit_indexes(min_hours=24):
+    """Lista índices sem uso ($indexStats) ou sobre campos quentes de escrita."""
+    agora = utcnow()
+    avisos = []
+    for nome_colecao in AUDITED_COLLECTIONS:
+        for stat in mongo.db[nome_colecao].aggregate([{"$indexStats": {}}]):
+            nome = stat.get("name")
+            if nome == "_id_":
+                continue
+            campos_quentes = [c for c in stat.get("key", {}) if c in WRITE_HOT_FIELDS]
+            if campos_quentes:
+                avisos.append(f"{nome_colecao}.{nome}: indexa {', '.join(campos_quentes)}, reescrito em todo PUT")
+            accesses = stat.get("accesses", {})
+            since = accesses.get("since")
+            if accesses.get("ops", 0) == 0 and since and (agora - since).total_seconds() >= min_hours * 3600:
+                avisos.append(f"{nome_colecao}.{nome}: nenhum acesso desde {since.isoformat()}, candidato a remoção")
+    for aviso in avisos:
+        logger.warning("Índice: %s", aviso)
+    return avisos
+
+
+@app.cli.command("audit-indexes")
+@click.option("--min-hours", default=24, show_default=True, help="Uptime mínimo (horas) para considerar um índice sem uso.")
+def audit_indexes_command(min_hours):
+    avisos = audit_indexes(min_hours)
+    if not avisos:
+        click.echo("Nenhum índice suspeito encontrado.")
+    for aviso in avisos:
+        click.echo(aviso)
 
 
 # -------------------------
@@ -383,9 +1120,7 @@ def deletar_report(id):
 if __name__ == "__main__":
     # índices
     try:
-        mongo.db.reports.create_index("task_id")
-        mongo.db.task_snapshots.create_index([("_id", 1)])
-        mongo.db.idempotency.create_index([("collection", 1), ("idempotency_key", 1)], unique=True, sparse=True)
+        ensure_indexes()
     except Exception:
         logger.warning("Falha ao criar índices iniciais")
 
@@ -0,0 +1,16 @@
+# gunicorn_conf.py (configuração de produção do reports service)
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+
+# workers gevent: cada espera de I/O (Mongo, JWKS, tasks-service) vira um yield de greenlet.
+# O próprio worker gevent do gunicorn faz o monkey.patch_all() antes de importar o app.
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gevent")
+# um processo por núcleo basta: cada worker gevent multiplexa até worker_connections conexões
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 1000))
+# usado apenas se GUNICORN_WORKER_CLASS=gthread
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+# keep-alive longo: o SPA reaproveita a mesma conexão TCP/TLS em várias chamadas CRUD seguidas
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 30))
@@ -1,15 +1,25 @@
 import pytest
+import threading
 import mongomock
 import sys
 import requests
 import os
+import time
+import jwt
+from jwt.algorithms import RSAAlgorithm
+from cryptography.hazmat.primitives.asymmetric import rsa
 from bson.objectid import ObjectId
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from pymongo import InsertOne, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError, WriteError
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from app import app, mongo
+import app as app_module
+from app import app, mongo, cache, MicroBatcher
 
 @pytest.fixture
 def client():
     app.config["TESTING"] = True
+    cache.clear()
 
     # Mocka o MongoDB em memória
     mongo.cx = mongomock.MongoClient()
@@ -45,6 +55,28 @@ def test_criar_report(client):
     assert resposta.json["conteudo"] == "Primeiro relatório"
     assert resposta.json["task_id"] == client.fake_task_id
 
+def test_ensure_indexes_sem_socket_timeout(client, monkeypatch):
+    clientes = []
+
+    def fake_mongo_client(uri, **kwargs):
+        clientes.append(kwargs)
+        return mongomock.MongoClient(uri)
+    monkeypatch.setattr(app_module, "MongoClient", fake_mongo_client)
+
+    app_module.ensure_indexes()
+    # build de índice não pode herdar o socketTimeoutMS curto das requisições
+    assert clientes[0]["socketTimeoutMS"] is None
+
+def test_json_provider_orjson(client):
+    from app import OrjsonProvider
+    assert isinstance(app.json, OrjsonProvider)
+
+    resposta = client.post("/reports", json={
+        "titulo": "Datas", "conteudo": "c", "task_id": client.fake_task_id
+    })
+    # datas em ISO, não no formato estendido {"$date": ...} do BSONProvider
+    assert isinstance(resposta.json["criado_em"], str)
+
 def test_listar_reports(client):
     client.post("/reports", json={
         "titulo": "Relatório 2", 
@@ -80,3 +112,427 @@ def test_deletar_report(client):
     delete_res = client.delete(f"/reports/{report_id}")
     assert delete_res.status_code == 200
     assert delete_res.json["message"] == "Relatório deletado com sucesso"
+
+def test_listar_reports_etag(client):
+    resposta = client.get("/reports")
+    etag = resposta.headers["ETag"]
+
+    nao_modificado = client.get("/reports", headers={"If-None-Match": etag})
+    assert nao_modificado.status_code == 304
+
+    client.post("/reports", json={
+        "titulo": "Relatório ETag",
+        "conteudo": "Muda a versão",
+        "task_id": client.fake_task_id
+    })
+    modificado = client.get("/reports", headers={"If-None-Match": etag})
+    assert modificado.status_code == 200
+    assert modificado.headers["ETag"] != etag
+    assert len(modificado.json) == 1
+
+def test_listar_reports_usa_cache(client):
+    client.post("/reports", json={
+        "titulo": "Relatório Cache",
+        "conteudo": "Servido do cache",
+        "task_id": client.fake_task_id
+    })
+    primeira = client.get("/reports")
+
+    # remoção direta no banco não muda a versão: a resposta deve vir do cache
+    mongo.db.reports.delete_many({})
+    segunda = client.get("/reports")
+    assert segunda.status_code == 200
+    assert segunda.json == primeira.json
+
+def test_listar_reports_grande_nao_vai_para_cache(client, monkeypatch):
+    monkeypatch.setattr(app_module, "REPORTS_CACHE_MAX_BYTES", 10)
+    client.post("/reports", json={
+        "titulo": "Relatório Grande",
+        "conteudo": "Maior que o limite do cache",
+        "task_id": client.fake_task_id
+    })
+    primeira = client.get("/reports")
+    assert len(primeira.json) == 1
+
+    # acima do limite o corpo não é cacheado: a remoção direta no banco aparece
+    mongo.db.reports.delete_many({})
+    assert client.get("/reports").json == []
+
+def test_criar_reports_bulk(client):
+    resposta = client.post("/reports/bulk", json=[
+        {"titulo": "Bulk 1", "conteudo": "Primeiro", "task_id": client.fake_task_id},
+        {"titulo": "Bulk 2", "conteudo": "Segundo", "task_id": client.fake_task_id}
+    ])
+    assert resposta.status_code == 201
+    assert [r["titulo"] for r in resposta.json] == ["Bulk 1", "Bulk 2"]
+    assert all(r["task_id"] == client.fake_task_id for r in resposta.json)
+
+    lista = client.get("/reports")
+    assert len(lista.json) == 2
+
+def test_criar_reports_bulk_item_invalido(client):
+    resposta = client.post("/reports/bulk", json=[
+        {"titulo": "Bulk 1", "conteudo": "Primeiro", "task_id": client.fake_task_id},
+        {"titulo": "Sem conteúdo", "task_id": client.fake_task_id}
+    ])
+    assert resposta.status_code == 400
+    assert resposta.json["index"] == 1
+    assert mongo.db.reports.count_documents({}) == 0
+
+def test_atualizar_report_id_invalido(client):
+    resposta = client.put("/reports/nao-e-um-id", json={"titulo": "X"})
+    assert resposta.status_code == 400
+    assert resposta.json["error"] == "ID inválido"
+
+def test_micro_batcher_agrupa_itens():
+    lotes = []
+
+    def flush(itens):
+        lotes.append(list(itens))
+        return [i * 2 for i in itens]
+
+    batcher = MicroBatcher("test-batcher", flush, max_wait=0.2)
+    resultados = {}
+
+    def enviar(i):
+        resultados[i] = batcher.submit(i)
+
+    threads = [threading.Thread(target=enviar, args=(i,)) for i in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert resultados == {i: i * 2 for i in range(5)}
+    assert sum(len(lote) for lote in lotes) == 5
+    assert len(lotes) < 5
+
+def test_micro_batcher_timeout_cancela_ou_espera():
+    liberar = threading.Event()
+    gravados = []
+
+    def flush(itens):
+        liberar.wait(1)
+        gravados.extend(itens)
+        return list(itens)
+
+    batcher = MicroBatcher("test-batcher-timeout", flush, max_wait=0)
+    resultados = {}
+    primeiro = threading.Thread(target=lambda: resultados.update(r=batcher.submit("em-curso", timeout=0.05)))
+    primeiro.start()
+    time.sleep(0.02)
+
+    # ainda na fila (o worker está preso no flush anterior): cancelado e nunca gravado
+    with pytest.raises(FutureTimeoutError):
+        batcher.submit("na-fila", timeout=0.05)
+    liberar.set()
+    primeiro.join()
+    # "em-curso" já estava no flush quando o timeout venceu: o submit esperou o resultado
+    assert resultados["r"] == "em-curso"
+    assert batcher.submit("depois") == "depois"
+    assert gravados == ["em-curso", "depois"]
+
+def test_micro_batcher_excecao_por_item():
+    def flush(itens):
+        return [ValueError(i) if i == "ruim" else i for i in itens]
+
+    batcher = MicroBatcher("test-batcher-erro", flush, max_wait=0)
+    with pytest.raises(ValueError):
+        batcher.submit("ruim")
+    assert batcher.submit("bom") == "bom"
+
+@pytest.fixture
+def bulk_write_stub(monkeypatch):
+    """bulk_write aplicado operação a operação: o do mongomock quebra com UpdateOne/ReplaceOne
+    no pymongo atual. ``falhar[coleção]`` lista os índices que viram writeErrors de um BulkWriteError."""
+    falhar = {}
+
+    def bulk_write(self, ops, ordered=True):
+        erros = []
+        for i, op in enumerate(ops):
+            if i in falhar.get(self.name, ()):
+                erros.append({"index": i, "code": 10334, "errmsg": "documento rejeitado", "op": {}})
+            elif isinstance(op, InsertOne):
+                self.insert_one(op._doc)
+            elif isinstance(op, UpdateOne):
+                self.update_one(op._filter, op._doc, upsert=op._upsert)
+            elif isinstance(op, ReplaceOne):
+                self.replace_one(op._filter, op._doc, upsert=op._upsert)
+        if erros:
+            raise BulkWriteError({"writeErrors": erros, "writeConcernErrors": []})
+
+    monkeypatch.setattr(mongomock.Collection, "bulk_write", bulk_write)
+    return falhar
+
+def _novo_report(client, titulo="Relatório"):
+    return client.post("/reports", json={
+        "titulo": titulo, "conteudo": "c", "task_id": client.fake_task_id
+    }).json["id"]
+
+def test_put_em_lote_funde_mesmo_id(client, bulk_write_stub):
+    report_id = ObjectId(_novo_report(client))
+    versao = app_module.get_reports_version()
+
+    resultados = app_module._flush_report_updates([
+        (report_id, {"titulo": "Primeiro"}),
+        (report_id, {"titulo": "Segundo", "conteudo": "novo"}),
+    ])
+    assert [r["titulo"] for r in resultados] == ["Segundo", "Segundo"]
+    assert mongo.db.reports.find_one({"_id": report_id})["conteudo"] == "novo"
+    assert app_module.get_reports_version() == versao + 1
+
+def test_put_em_lote_falha_parcial(client, bulk_write_stub):
+    ok_id = ObjectId(_novo_report(client, "OK"))
+    ruim_id = ObjectId(_novo_report(client, "Ruim"))
+    versao = app_module.get_reports_version()
+    bulk_write_stub["reports"] = {1}
+
+    resultados = app_module._flush_report_updates([(ok_id, {"titulo": "Novo"}), (ruim_id, {"titulo": "Novo"})])
+    assert resultados[0]["titulo"] == "Novo"
+    assert isinstance(resultados[1], WriteError)
+    # a versão muda mesmo com falha parcial: o $set aplicado não pode ficar atrás de cache/ETag
+    assert app_module.get_reports_version() == versao + 1
+
+def test_put_em_lote_pela_rota(client, bulk_write_stub, monkeypatch):
+    monkeypatch.setattr(app_module, "_report_update_batcher",
+                        MicroBatcher("test-update-batcher", app_module._flush_report_updates, max_wait=0.01))
+    report_id = _novo_report(client)
+
+    resposta = client.put(f"/reports/{report_id}", json={"titulo": "Em lote"})
+    assert resposta.status_code == 200
+    assert resposta.json["titulo"] == "Em lote"
+    assert client.put(f"/reports/{ObjectId()}", json={"titulo": "x"}).status_code == 404
+
+def test_post_em_lote_idempotente(client, bulk_write_stub, monkeypatch):
+    monkeypatch.setattr(app_module, "_report_insert_batcher",
+                        MicroBatcher("test-insert-batcher", app_module._flush_report_inserts, max_wait=0.01))
+    corpo = {"titulo": "Em lote", "conteudo": "c", "task_id": client.fake_task_id}
+    headers = {"Idempotency-Key": "lote-1"}
+    versao = app_module.get_reports_version()
+
+    primeira = client.post("/reports", json=corpo, headers=headers)
+    assert primeira.status_code == 201
+    assert app_module.get_reports_version() == versao + 1
+
+    replay = client.post("/reports", json=corpo, headers=headers)
+    assert replay.status_code == 200
+    assert replay.json["id"] == primeira.json["id"]
+    assert mongo.db.reports.count_documents({}) == 1
+
+def test_post_em_lote_falha_parcial(client, bulk_write_stub):
+    itens = []
+    for i in range(3):
+        doc = {"_id": ObjectId(), "titulo": f"Lote {i}", "conteudo": "c"}
+        itens.append((doc, f"chave-{i}", {"id": str(doc["_id"]), "titulo": doc["titulo"]}))
+    versao = app_module.get_reports_version()
+    bulk_write_stub["reports"] = {1}
+
+    resultados = app_module._flush_report_inserts(itens)
+    assert resultados[0] is None and resultados[2] is None
+    assert isinstance(resultados[1], WriteError)
+    assert mongo.db.reports.count_documents({}) == 2
+    # idempotency só para os inserts gravados; a versão muda mesmo com a falha parcial
+    assert app_module.get_idempotency_record("reports", "chave-0") is not None
+    assert app_module.get_idempotency_record("reports", "chave-1") is None
+    assert app_module.get_idempotency_record("reports", "chave-2") is not None
+    assert app_module.get_reports_version() == versao + 1
+
+def test_datas_em_epoch_ms(client):
+    resposta = client.post("/reports?date_format=epoch_ms", json={
+        "titulo": "Relatório Epoch",
+        "conteudo": "Datas numéricas",
+        "task_id": client.fake_task_id
+    })
+    assert resposta.status_code == 201
+    assert isinstance(resposta.json["criado_em"], int)
+
+    iso = client.get("/reports")
+    assert isinstance(iso.json[0]["criado_em"], str)
+    epoch = client.get("/reports?date_format=epoch_ms")
+    assert isinstance(epoch.json[0]["criado_em"], int)
+    assert iso.headers["ETag"] != epoch.headers["ETag"]
+
+def test_listar_reports_paginado(client):
+    client.post("/reports/bulk", json=[
+        {"titulo": f"Página {i}", "conteudo": "Paginação", "task_id": client.fake_task_id}
+        for i in range(3)
+    ])
+    primeira = client.get("/reports?limit=2")
+    assert primeira.status_code == 200
+    assert len(primeira.json) == 2
+
+    segunda = client.get(f"/reports?limit=2&after={primeira.json[-1]['id']}")
+    assert [r["titulo"] for r in segunda.json] == ["Página 2"]
+
+    assert client.get("/reports?limit=0").status_code == 400
+    # dígitos Unicode que int() não aceita (ex.: sobrescrito) também dão 400, não 500
+    assert client.get("/reports?limit=²").status_code == 400
+
+def test_task_inexistente_usa_cache_negativo(client, monkeypatch):
+    chamadas = []
+
+    class RespostaFake:
+        status_code = 404
+
+    def get_fake(url, **kwargs):
+        chamadas.append(url)
+        return RespostaFake()
+
+    monkeypatch.setattr(app_module._http_session, "get", get_fake)
+    task_id = str(ObjectId())
+    for _ in range(2):
+        resposta = client.post("/reports", json={"titulo": "X", "conteudo": "Y", "task_id": task_id})
+        assert resposta.status_code == 400
+        assert resposta.json["error"] == "Task não encontrada"
+    assert len(chamadas) == 1
+
+def test_task_do_tasks_service_vira_snapshot(client, monkeypatch):
+    task_id = str(ObjectId())
+
+    class RespostaFake:
+        status_code = 200
+
+        def json(self):
+            return {"titulo": "Remota", "descricao": "Veio do tasks-service", "owner": "test-user"}
+
+    monkeypatch.setattr(app_module._http_session, "get", lambda url, **kwargs: RespostaFake())
+    resposta = client.post("/reports", json={"titulo": "X", "conteudo": "Y", "task_id": task_id})
+    assert resposta.status_code == 201
+
+    snapshot = mongo.db.task_snapshots.find_one({"_id": ObjectId(task_id)})
+    assert snapshot["titulo"] == "Remota"
+
+def test_criar_report_idempotente(client):
+    corpo = {"titulo": "Idem", "conteudo": "Uma vez só", "task_id": client.fake_task_id}
+    headers = {"Idempotency-Key": "chave-1"}
+    primeira = client.post("/reports", json=corpo, headers=headers)
+    segunda = client.post("/reports", json=corpo, headers=headers)
+    assert primeira.status_code == 201
+    assert segunda.status_code == 200
+    assert segunda.json["id"] == primeira.json["id"]
+    assert mongo.db.reports.count_documents({}) == 1
+
+def test_atualizar_report_fields(client):
+    resposta = client.post("/reports", json={
+        "titulo": "Relatório Campos",
+        "conteudo": "Conteúdo grande",
+        "task_id": client.fake_task_id
+    })
+    report_id = resposta.json["id"]
+
+    update_res = client.put(f"/reports/{report_id}?fields=atualizado_em", json={"titulo": "Novo"})
+    assert update_res.status_code == 200
+    assert set(update_res.json) == {"id", "atualizado_em"}
+
+    assert client.put(f"/reports/{report_id}?fields=senha", json={}).status_code == 400
+
+def test_cors_allowed_origin(client):
+    resp = client.get("/health", headers={"Origin": "http://localhost:5173"})
+    assert resp.headers["Access-Control-Allow-Origin"] == "http://localhost:5173"
+    assert resp.headers["Access-Control-Allow-Credentials"] == "true"
+    assert "Origin" in resp.headers["Vary"]
+
+    resp = client.get("/health", headers={"Origin": "http://evil.example"})
+    assert "Access-Control-Allow-Origin" not in resp.headers
+
+def test_cors_preflight(client):
+    resp = client.options("/reports", headers={
+        "Origin": "http://localhost:5173",
+        "Access-Control-Request-Method": "POST",
+    })
+    assert resp.status_code == 204
+    assert resp.headers["Access-Control-Allow-Origin"] == "http://localhost:5173"
+    assert "POST" in resp.headers["Access-Control-Allow-Methods"]
+    assert "Authorization" in resp.headers["Access-Control-Allow-Headers"]
+
+    # rota inexistente mantém o 404 do roteamento; origem não permitida não ganha preflight
+    assert client.options("/nope", headers={"Origin": "http://localhost:5173"}).status_code == 404
+    resp = client.options("/reports", headers={"Origin": "http://evil.example"})
+    assert resp.status_code != 204
+    assert "Access-Control-Allow-Origin" not in resp.headers
+
+# -------------------------
+# Auth (TESTING desligado: passa pelo requires_auth_api de verdade)
+# -------------------------
+AUTH_DOMAIN = "tenant.example.com"
+AUTH_AUDIENCE = "reports-api"
+
+@pytest.fixture(scope="module")
+def rsa_private_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+@pytest.fixture
+def auth_client(client, monkeypatch, rsa_private_key):
+    monkeypatch.setitem(app.config, "TESTING", False)
+    monkeypatch.setattr(app_module, "AUTH0_DOMAIN", AUTH_DOMAIN)
+    monkeypatch.setattr(app_module, "AUTH0_AUDIENCE", AUTH_AUDIENCE)
+    # sem thread de refresh em background durante os testes
+    monkeypatch.setattr(app_module, "_start_jwks_refresher", lambda: None)
+    for key, value in {"fetched_at": 0, "jwks": None, "by_kid": {}, "ttl": 3600,
+                       "forced_at": 0, "etag": None, "last_modified": None}.items():
+        monkeypatch.setitem(app_module._JWKS_CACHE, key, value)
+    app_module._TOKEN_CACHE.clear()
+
+    jwk = RSAAlgorithm.to_jwk(rsa_private_key.public_key(), as_dict=True)
+    jwk.update({"kid": "chave-1", "use": "sig"})
+
+    class FakeResponse:
+        status_code = 200
+        headers = {"Cache-Control": "max-age=600"}
+        def raise_for_status(self):
+            pass
+        def json(self):
+            return {"keys": [jwk]}
+
+    client.jwks_calls = []
+    def fake_get(url, **kwargs):
+        client.jwks_calls.append(url)
+        return FakeResponse()
+    monkeypatch.setattr(app_module._http_session, "get", fake_get)
+
+    def make_token(kid="chave-1", **overrides):
+        now = int(time.time())
+        claims = {"sub": "user-1", "aud": AUTH_AUDIENCE, "iss": f"https://{AUTH_DOMAIN}/",
+                  "iat": now, "exp": now + 600}
+        claims.update(overrides)
+        claims = {k: v for k, v in claims.items() if v is not None}
+        return jwt.encode(claims, rsa_private_key, algorithm="RS256", headers={"kid": kid})
+    client.make_token = make_token
+
+    yield client
+    app_module._TOKEN_CACHE.clear()
+
+def test_auth_token_valido_e_cache(auth_client):
+    token = auth_client.make_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    assert auth_client.get("/reports", headers=headers).status_code == 200
+    assert auth_client.get("/reports", headers=headers).status_code == 200
+    # JWKS buscado uma única vez; a segunda chamada nem chega a verificar (cache de tokens)
+    assert len(auth_client.jwks_calls) == 1
+    assert len(app_module._TOKEN_CACHE) == 1
+
+def test_auth_tokens_invalidos(auth_client):
+    now = int(time.time())
+    tokens = [
+        auth_client.make_token(iat=now - 1200, exp=now - 600),
+        auth_client.make_token(aud="outra-api"),
+        auth_client.make_token(iat=None),
+    ]
+    for token in tokens:
+        resp = auth_client.get("/reports", headers={"Authorization": f"Bearer {token}"})
+        assert resp.status_code == 401
+
+def test_auth_kid_desconhecido_refaz_fetch_uma_vez(auth_client):
+    token = auth_client.make_token(kid="chave-rotacionada")
+    headers = {"Authorization": f"Bearer {token}"}
+    assert auth_client.get("/reports", headers=headers).status_code == 401
+    assert auth_client.get("/reports", headers=headers).status_code == 401
+    # fetch inicial + um único refetch forçado (os seguintes ficam no rate limit)
+    assert len(auth_client.jwks_calls) == 2
+
+def test_auth_header_bearer(auth_client):
+    token = auth_client.make_token()
+    assert auth_client.get("/reports", headers={"Authorization": f"bearer {token}"}).status_code == 200
+    assert auth_client.get("/reports", headers={"Authorization": f"Bearer {token} x"}).status_code == 401
+    assert auth_client.get("/reports", headers={"Authorization": f"Basic {token}"}).status_code == 401
+    assert auth_client.get("/reports").status_code == 401